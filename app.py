@@ -1,41 +1,206 @@
 import streamlit as st
 import time
+import io
 import os
 from datetime import datetime
-import uuid
-import pinecone
-from pinecone import ServerlessSpec, Pinecone 
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 import re
 
 # Import custom modules
-from database import Database
-from rag_system import RAGSystem
-from chunking import parse_markdown, chunk_content
-from embedding import generate_and_store_embeddings
+from database import Database, Message
 
-import re
+# Valid Pinecone index names: lowercase letters, digits and hyphens
+_INDEX_NAME_RE = re.compile(r'[a-z0-9\-]+')
 
-import re
-import pinecone
-import streamlit as st
+# Number of chat messages rendered per page of history
+MESSAGE_PAGE_SIZE = 30
 
-import re
-from pinecone import Pinecone
-import streamlit as st
+# Prompts starting with this flag always go to the RAG pipeline
+NOCACHE_FLAG = "#nocache"
+
+# Number of exact-match answers remembered per session
+RESPONSE_CACHE_SIZE = 128
+
+# Number of conversations listed per page in the sidebar
+SIDEBAR_CONVERSATION_PAGE_SIZE = 50
+
+# Number of conversations listed per page in the admin dashboard
+ADMIN_CONVERSATION_PAGE_SIZE = 100
+
+@st.cache_resource(show_spinner=False)
+def _get_pc(api_key):
+    """Return a Pinecone client shared across reruns for the given API key"""
+    # Imported lazily so sessions that never touch Pinecone skip the SDK import
+    from pinecone import Pinecone
+    return Pinecone(api_key=api_key)
+
+@st.cache_resource(show_spinner=False)
+def _get_index(api_key, index_name, host=None, pool_threads=None):
+    """Return an Index handle shared across reruns; a known host skips the describe_index lookup"""
+    pc = _get_pc(api_key)
+    # pool_threads sizes the thread pool behind async_req upserts
+    kwargs = {"pool_threads": pool_threads} if pool_threads else {}
+    if host:
+        return pc.Index(host=host, **kwargs)
+    return pc.Index(index_name, **kwargs)
+
+@st.cache_data(show_spinner=False)
+def _index_host(api_key, index_name):
+    """Resolve an index's data-plane host once"""
+    return _get_pc(api_key).describe_index(index_name).host
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _list_indexes(api_key):
+    """Return (name, host) pairs for the indexes visible to the given API key (cached briefly)"""
+    return tuple((index.name, index.host) for index in _get_pc(api_key).list_indexes())
+
+def _index_names(api_key):
+    """Return the set of index names visible to the given API key"""
+    return frozenset(name for name, _ in _list_indexes(api_key))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _index_stats_map(api_key, indexes):
+    """Fetch stats for several (name, host) indexes concurrently; a failed fetch maps to {"error": message}"""
+    def fetch_stats(index):
+        name, host = index
+        try:
+            return _get_index(api_key, name, host).describe_index_stats().to_dict()
+        except Exception as e:
+            print(f"Error fetching stats for index {name}: {e}")
+            return {"error": str(e)}
+    
+    if not indexes:
+        return {}
+    
+    # One request per index, bounded so large accounts don't open too many connections at once
+    with ThreadPoolExecutor(max_workers=min(8, len(indexes))) as executor:
+        return {name: stats for (name, _), stats in zip(indexes, executor.map(fetch_stats, indexes))}
+
+def _delete_legacy_vectors(api_key, index_name):
+    """Delete vectors stored under the old chunk_<batch>_<n> ids and return how many were removed"""
+    index = _get_index(api_key, index_name)
+    deleted = 0
+    # list() pages through ids by prefix (serverless indexes only); each page is at most 100 ids
+    for ids in index.list(prefix="chunk_"):
+        index.delete(ids=ids)
+        deleted += len(ids)
+    return deleted
+
+def _invalidate_index_caches():
+    """Drop cached index metadata and handles after an index is created or deleted"""
+    _list_indexes.clear()
+    _index_host.clear()
+    _index_stats_map.clear()
+    _get_index.clear()
+
+@st.cache_resource(show_spinner=False)
+def _get_cohere(api_key):
+    """Return a Cohere client shared across sessions for the given API key"""
+    import cohere
+    return cohere.ClientV2(api_key=api_key)
+
+@st.cache_resource(show_spinner=False)
+def _get_embedding_model():
+    """Return the query embedding model, loaded once per process"""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer("all-mpnet-base-v2")
+
+def _build_rag(api_key, pinecone_api_key, pinecone_environment, index_name, index_host=None):
+    """Build a RAGSystem for this session around the shared clients and embedding model"""
+    # Not cached itself: RAGSystem keeps a running summary of the open conversation,
+    # so only its stateless parts are shared between sessions
+    from rag_system import RAGSystem
+    return RAGSystem(
+        api_key=api_key,
+        pinecone_api_key=pinecone_api_key,
+        pinecone_environment=pinecone_environment,
+        index_name=index_name,
+        index_host=index_host,
+        co=_get_cohere(api_key),
+        index=_get_index(pinecone_api_key, index_name, index_host),
+        embedding_model=_get_embedding_model()
+    )
+
+def _reset_conversation_memory():
+    """Forget the previous conversation's running summary when another one is opened"""
+    rag_system = st.session_state.get("rag_system")
+    if rag_system is not None:
+        rag_system.reset_conversation_memory()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _user_conversations(_db, user_id, is_admin, limit):
+    """Return the newest conversations for the sidebar list"""
+    return _db.get_user_conversations(user_id, is_admin=is_admin, limit=limit)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _all_conversations(_db, user_id, limit):
+    """Return the newest conversations across all users for the admin dashboard"""
+    return _db.get_user_conversations(user_id, is_admin=True, limit=limit)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _all_users(_db):
+    """Return every user for the admin dashboard"""
+    return _db.get_all_users()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _user_details(_db, user_id):
+    """Return a user's email, admin flag and API keys"""
+    return _db.get_user_details(user_id)
+
+def _invalidate_user_caches():
+    """Drop cached user data after a user is added or their keys change"""
+    _all_users.clear()
+    _user_details.clear()
+
+def _invalidate_conversation_caches():
+    """Drop cached conversation lists after a conversation is created, renamed or deleted"""
+    _user_conversations.clear()
+    _all_conversations.clear()
+
+def _user_bootstrap():
+    """Return the user's details and default index, loaded once per session"""
+    # Popped when an admin changes the default index so the next read refetches it
+    if "user_bootstrap" not in st.session_state:
+        st.session_state.user_bootstrap = st.session_state.db.get_user_bootstrap(st.session_state.user_id)
+    return st.session_state.user_bootstrap or {}
+
+def _default_index():
+    """Return the default Pinecone index as {"index_name", "environment"}, or None"""
+    return _user_bootstrap().get("default_index")
+
+@st.cache_resource(show_spinner=False)
+def _get_semantic_cache():
+    """Return the process-wide semantic response cache"""
+    from semantic_cache import SemanticCache
+    return SemanticCache()
+
+@st.cache_resource(show_spinner=False)
+def _knowledge_base_versions():
+    """Return the process-wide {index_name: version} map, bumped whenever an index's contents change"""
+    return {}
+
+def _invalidate_answer_caches(index_name):
+    """Stop serving cached answers grounded in an index that was re-uploaded, reset or deleted"""
+    _get_semantic_cache().clear_index(index_name)
+    # Session exact-match caches key on the version, so every session's entries go stale at once
+    versions = _knowledge_base_versions()
+    versions[index_name] = versions.get(index_name, 0) + 1
 
 def initialize_pinecone(api_key, environment, index_name, dimension=768):
+    from pinecone import ServerlessSpec
+    
     try:
         # Validate the index name using a regular expression
-        if not re.match(r'^[a-z0-9\-]+$', index_name):
+        if not _INDEX_NAME_RE.fullmatch(index_name):
             st.error("Invalid index name. It must consist of lowercase alphanumeric characters or hyphens (-).")
             return None
         
         # Initialize Pinecone client
-        pc = Pinecone(api_key=api_key)
+        pc = _get_pc(api_key)
         
         # Check if the index exists
-        index_list = [index.name for index in pc.list_indexes()]
-        if index_name in index_list:
+        if index_name in _index_names(api_key):
             st.info(f"Pinecone index '{index_name}' already exists.")
             
             # Ask the user what to do
@@ -48,6 +213,7 @@ def initialize_pinecone(api_key, environment, index_name, dimension=768):
             if action == "Delete and Create New Index":
                 # Delete the existing index
                 pc.delete_index(index_name)
+                _invalidate_index_caches()
                 st.success(f"Deleted existing Pinecone index '{index_name}'.")
                 
                 # Create a new index
@@ -57,6 +223,7 @@ def initialize_pinecone(api_key, environment, index_name, dimension=768):
                     metric='cosine',
                     spec=ServerlessSpec(cloud='aws', region=environment)
                 )
+                _invalidate_index_caches()
                 st.success(f"Created new Pinecone index '{index_name}'.")
             else:
                 st.info(f"Using existing Pinecone index '{index_name}'.")
@@ -68,10 +235,11 @@ def initialize_pinecone(api_key, environment, index_name, dimension=768):
                 metric='cosine',
                 spec=ServerlessSpec(cloud='aws', region=environment)
             )
+            _invalidate_index_caches()
             st.success(f"Pinecone index '{index_name}' created successfully.")
         
         # Return the Pinecone index object
-        return pc.Index(index_name)
+        return _get_index(api_key, index_name)
     
     except Exception as e:
         st.error(f"Unexpected error initializing Pinecone: {str(e)}")
@@ -92,7 +260,7 @@ def select_pinecone_index():
     st.info("Your organization's Pinecone index is managed by administrators.")
     
     # Show current index if available
-    current_default = st.session_state.db.get_default_pinecone_index(st.session_state.user_id)
+    current_default = _default_index()
     if current_default:
         st.success(f"You are connected to the '{current_default['index_name']}' index.")
     else:
@@ -100,11 +268,28 @@ def select_pinecone_index():
         
     st.markdown("If you're experiencing issues or need a different index, please contact your administrator.")
 # Configuration for Neon database
+@st.cache_resource(show_spinner=False)
+def _get_database(db_url):
+    """Return one Database per URL; its connection pool is shared by every session"""
+    return Database(db_url)
+
+def _secrets_db_url():
+    """Return the URL configured under [connections.neon] in secrets.toml, or None"""
+    try:
+        return st.secrets["connections"]["neon"]["url"]
+    except Exception:
+        # No secrets file, or no neon connection in it
+        return None
+
 def get_db_connection():
     # Check for the database URL in session state first (for testing)
     db_url = st.session_state.get("db_url")
     
-    # If not in session state, try environment variable
+    # Then the app's secrets, the same place st.connection would read it from
+    if not db_url:
+        db_url = _secrets_db_url()
+    
+    # If not in secrets, try environment variable
     if not db_url:
         db_url = os.environ.get("DATABASE_URL")
     
@@ -117,22 +302,93 @@ def get_db_connection():
             
             db_url = st.text_input("Neon Database URL", 
                                    key="manual_db_url",
-                                   help="Enter your Neon database connection URL",
+                                   help="Enter your Neon database connection URL. Use the pooled "
+                                        "connection string (the -pooler hostname) so connections go through PgBouncer.",
                                    type="password")
             
             if db_url and st.button("Connect", type="primary"):
                 st.session_state.db_url = db_url
-                return Database(db_url)
+                return _get_database(db_url)
         
         # Return None if no URL is available yet
         return None
     
     # Return database connection with the URL
-    return Database(db_url)
+    return _get_database(db_url)
 
 
 # Improved Streamlit UI Components
+@st.fragment
+def _conversation_list(is_admin_view):
+    """Render the sidebar conversation list; its widgets only rerun this fragment"""
+    # Fetch one extra row to know whether a "Load more" button is needed
+    conversation_limit = st.session_state.get("sidebar_conversation_limit", SIDEBAR_CONVERSATION_PAGE_SIZE)
+    conversations = _user_conversations(
+        st.session_state.db,
+        st.session_state.user_id,
+        is_admin_view,
+        conversation_limit + 1
+    )
+    has_more_conversations = len(conversations) > conversation_limit
+    conversations = conversations[:conversation_limit]
+
+    with st.expander("💬 Your Conversations", expanded=True):
+        if not conversations:
+            st.info("No conversations yet. Start a new chat!")
+        else:
+            conversation_titles = {conv[0]: conv[1] for conv in conversations}
+            conversation_ids = list(conversation_titles)
+            current_id = st.session_state.get("current_conversation_id")
+            
+            def conversation_label(conv_id):
+                # Truncate long conversation titles
+                title = f"{conversation_titles[conv_id]}"
+                return title[:22] + "..." if len(title) > 25 else title
+            
+            # One radio instead of a select and a delete button per conversation. It is keyed
+            # on the open conversation so the selection follows changes made outside the list.
+            selected_id = st.radio(
+                "Conversations",
+                conversation_ids,
+                index=conversation_ids.index(current_id) if current_id in conversation_titles else None,
+                format_func=conversation_label,
+                key=f"conversation_radio_{current_id}",
+                label_visibility="collapsed"
+            )
+            
+            if selected_id is not None and selected_id != current_id:
+                st.session_state.current_conversation_id = selected_id
+                st.session_state.conversation_title = conversation_titles[selected_id]
+                st.session_state.viewing_as_admin = False
+                load_conversation_messages()
+                # The chat pane lives outside this fragment, so redraw the whole page
+                st.rerun()
+            
+            # Any listed conversation can be deleted without opening it first; the picker
+            # defaults to the open one and adds two widgets instead of one button per row
+            with st.popover("🗑️ Delete a conversation", use_container_width=True):
+                conversation_to_delete = st.selectbox(
+                    "Conversation",
+                    conversation_ids,
+                    index=conversation_ids.index(current_id) if current_id in conversation_titles else 0,
+                    format_func=conversation_label,
+                    key=f"delete_conversation_{current_id}"
+                )
+                if st.button("Delete", key="sidebar_delete_conversation", type="primary", use_container_width=True):
+                    # Delete conversation immediately without confirmation
+                    delete_conversation(conversation_to_delete)
+    
+        if has_more_conversations and st.button("Load more", key="sidebar_load_more_conversations"):
+            st.session_state.sidebar_conversation_limit = conversation_limit + SIDEBAR_CONVERSATION_PAGE_SIZE
+            st.rerun(scope="fragment")
+
 def create_sidebar():
+    # Read the session flags once per rerun
+    ss = st.session_state
+    authenticated = ss.get("authenticated", False)
+    is_admin = ss.get("is_admin", False)
+    admin_view = ss.get("admin_view", False)
+    
     with st.sidebar:
         st.image("assests//company_logo.png", width=150)
         
@@ -141,11 +397,11 @@ def create_sidebar():
         st.title("Golden Gate Ventures")
         st.markdown("*Internal Knowledge Assistant*")
         
-        if st.session_state.get("authenticated", False):
+        if authenticated:
             # If user is admin, show admin controls
-            if st.session_state.get("is_admin", False):
+            if is_admin:
                 # Toggle between admin view and chat view
-                if st.session_state.get("admin_view", False):
+                if admin_view:
                     st.button("💬 Chat View", on_click=toggle_admin_view, type="primary", use_container_width=True)
                 else:
                     st.button("🔧 Admin Dashboard", on_click=toggle_admin_view, type="primary", use_container_width=True)
@@ -157,49 +413,20 @@ def create_sidebar():
             st.markdown("---")
             
             # Only show conversation list in chat view
-            if not st.session_state.get("admin_view", False):
+            if not admin_view:
                 # Display user's conversations with improved UI
-                st.subheader("💬 Your Conversations")
                 # Regular users see their own conversations, admins see all if in admin view
-                is_admin_view = st.session_state.get("is_admin", False) and st.session_state.get("admin_view", False)
-                conversations = st.session_state.db.get_user_conversations(
-                    st.session_state.user_id, 
-                    is_admin=is_admin_view
-                )
-
-                if not conversations:
-                    st.info("No conversations yet. Start a new chat!")
-                
-                for conv in conversations:
-                    with st.container():
-                        cols = st.columns([4, 1])
-                        # Make button look like a conversation entry
-                        button_label = f"{conv[1]}"
-                        # Truncate long conversation titles
-                        if len(button_label) > 25:
-                            button_label = button_label[:22] + "..."
-                        
-                        with cols[0]:
-                            if st.button(button_label, key=f"conv_{conv[0]}", use_container_width=True):
-                                st.session_state.current_conversation_id = conv[0]
-                                st.session_state.conversation_title = conv[1]
-                                st.session_state.viewing_as_admin = False
-                                load_conversation_messages()
-                        
-                        with cols[1]:
-                            if st.button("🗑️", key=f"del_{conv[0]}", help="Delete conversation"):
-                                # Delete conversation immediately without confirmation
-                                delete_conversation(conv[0])
+                is_admin_view = is_admin and admin_view
+                _conversation_list(is_admin_view)
             
             st.markdown("---")
             # User info and logout section
             if "email" in st.session_state:
-                user_type = "Admin" if st.session_state.get("is_admin", False) else "User"
+                user_type = "Admin" if is_admin else "User"
                 st.caption(f"Logged in as: **{st.session_state.email}** ({user_type})")
             
             if st.button("🚪 Logout", type="secondary", use_container_width=True):
-                for key in list(st.session_state.keys()):
-                    del st.session_state[key]
+                st.session_state.clear()
                 st.rerun()
         else:
             st.info("Please login to continue.")
@@ -210,66 +437,65 @@ def toggle_admin_view():
 
 def delete_conversation(conv_id):
     st.session_state.db.delete_conversation(conv_id)
+    _invalidate_conversation_caches()
     # Reset current conversation if we're deleting the active one
     if st.session_state.current_conversation_id == conv_id:
         # Clear conversation-specific session state
         st.session_state.current_conversation_id = None
         st.session_state.conversation_title = None
-        st.session_state.chat_messages = []
         st.session_state.chat_history = []
-        st.session_state.messages = []
-        # Start a new chat session
+        # Start a new chat session and redraw the chat pane as well
         start_new_chat()
-    # Force a full rerun to update the sidebar
-    st.rerun()
+        st.rerun()
+    # Otherwise only the sidebar list needs to be redrawn
+    st.rerun(scope="fragment")
 
 def load_conversation_messages():
     if st.session_state.get("current_conversation_id"):
-        # Check if user has permission to access this conversation
-        if not st.session_state.db.can_access_conversation(
+        # Check permission and get ALL messages for this conversation in one query
+        found, authorized, messages = st.session_state.db.get_messages_if_authorized(
             st.session_state.user_id, 
             st.session_state.current_conversation_id
-        ):
-            st.error("You don't have permission to access this conversation")
+        )
+        if not found or not authorized:
+            # Shown by display_chat_interface, since the rerun below clears this run's output
+            st.session_state.conversation_error = (
+                "This conversation no longer exists." if not found
+                else "You don't have permission to access this conversation"
+            )
             start_new_chat()
             st.rerun()
             return
             
-        # Get ALL messages for this conversation
-        messages = st.session_state.db.get_conversation_messages(st.session_state.current_conversation_id)
-        st.session_state.chat_messages = messages
-        
-        # Use the complete conversation history
+        # One list of Message rows feeds both the chat UI and the RAG system
         st.session_state.chat_history = messages
-        
-        # Update the messages for the chat UI
-        st.session_state.messages = []
-        for msg in messages:
-            is_user = msg[1]
-            content = msg[2]
-            role = "user" if is_user else "assistant"
-            st.session_state.messages.append({"role": role, "content": content})
+        st.session_state.visible_count = MESSAGE_PAGE_SIZE
+        _reset_conversation_memory()
 
 def start_new_chat():
-    # Create a new conversation with a default title
+    # Start an unsaved chat with a default title; the conversation row is only
+    # inserted once the first message is sent (see _save_pending_conversation)
     default_title = f"New chat {datetime.now().strftime('%Y-%m-%d %H:%M')}"
     
-    try:
-        conversation_id = st.session_state.db.create_conversation(
-            st.session_state.user_id, 
-            default_title
-        )
-        
-        # Update session state
-        st.session_state.current_conversation_id = conversation_id
-        st.session_state.conversation_title = default_title
-        st.session_state.chat_messages = []
-        st.session_state.chat_history = []
-        st.session_state.messages = []  # Clear the chat UI messages
-        
-    except Exception as e:
-        st.error(f"Failed to start new chat: {e}")
-        print(f"Error starting new chat: {e}")
+    # Update session state
+    st.session_state.current_conversation_id = None
+    st.session_state.conversation_title = default_title
+    st.session_state.chat_history = []
+    st.session_state.visible_count = MESSAGE_PAGE_SIZE
+    _reset_conversation_memory()
+
+def _save_pending_conversation():
+    """Insert the unsaved new chat into the database; returns True if a row was created"""
+    if st.session_state.get("current_conversation_id") is not None:
+        return False
+    title = st.session_state.get("conversation_title") or f"New chat {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    st.session_state.current_conversation_id = st.session_state.db.create_conversation(
+        st.session_state.user_id,
+        title
+    )
+    st.session_state.conversation_title = title
+    _invalidate_conversation_caches()
+    return True
 
 # Modified display_auth_page() function
 def display_auth_page():
@@ -302,7 +528,8 @@ def display_auth_page():
                     else:
                         if not is_admin_login:
                             # Non-admin login (no password required)
-                            success, result = st.session_state.db.login_user_without_password(email)
+                            with st.spinner("Signing in..."):
+                                success, result = st.session_state.db.login_user_without_password(email)
                             if not success:
                                 st.error(result)
                             elif result.get("is_admin", False):
@@ -318,7 +545,8 @@ def display_auth_page():
                                 st.rerun()
                         else:
                             # Admin login with password verification
-                            success, result = st.session_state.db.login_user(email, password)
+                            with st.spinner("Signing in..."):
+                                success, result = st.session_state.db.login_user(email, password)
                             if success:
                                 if not result.get("is_admin", False):
                                     st.error("This account does not have admin privileges")
@@ -334,467 +562,747 @@ def display_auth_page():
                                 st.error(result)
             
             st.info("If you don't have an account, please contact an administrator.")
-def display_admin_page():
-    """Display the admin dashboard with user management, Pinecone API key management, knowledge base management, and conversations."""
-    st.title("🔧 Admin Dashboard")
+# Keyed on the file's bytes, so reruns and re-uploads of the same file skip parsing.
+# Chunk lists of large files are big, so only a few are kept
+@st.cache_data(show_spinner=False, max_entries=4)
+def _parse_and_chunk(md_bytes, max_tokens=500):
+    """Decode, parse and chunk markdown line by line, without a decoded copy of the whole file"""
+    # Imported on first upload so sessions that never ingest skip loading tiktoken
+    from chunking import parse_markdown, chunk_content
     
-    # Create tabs for different admin functions
-    # Update tabs to include Pinecone Index Selection
-    admin_tabs = st.tabs([
-        "👥 User Management", 
-        "🔑 Pinecone API Key Management", 
-        "📚 Knowledge Base Management",
-        "🔍 Pinecone Index Management",  # New tab for Pinecone index management
-        "💬 All Conversations",
-    ])
+    # BytesIO shares the bytes object's buffer rather than copying it
+    text_stream = io.TextIOWrapper(io.BytesIO(md_bytes), encoding="utf-8")
+    return list(chunk_content(parse_markdown(text_stream), max_tokens=max_tokens))
+
+@st.dialog("Confirm delete")
+def _confirm_delete_index(api_key, index_name):
+    st.write(f"Permanently delete the Pinecone index '{index_name}' and all of its vectors?")
+    if st.button("Delete", type="primary"):
+        try:
+            _get_pc(api_key).delete_index(index_name)
+            _invalidate_index_caches()
+            _invalidate_answer_caches(index_name)
+            # Refresh the UI with the updated index list
+            st.rerun()
+        except Exception as e:
+            st.error(f"Error deleting index: {str(e)}")
+
+@st.dialog("Confirm reset")
+def _confirm_reset_index(api_key, environment, index_name):
+    from pinecone import ServerlessSpec
     
-    # User Management Tab
-    with admin_tabs[0]:
-        st.subheader("Manage Users")
-        
-        # Form to add new users
-        with st.form("add_user_form"):
-            st.subheader("Register New User")
-            new_email = st.text_input("Email")
-            is_admin = st.checkbox("Admin privileges")
-            api_key = st.text_input("Cohere API Key", help="Enter Cohere API key to be used by this user")
-            pinecone_api_key = st.text_input("Pinecone API Key", help="Enter Pinecone API key to be used by this user")
-            
-            submitted = st.form_submit_button("Add User", type="primary")
-            
-            if submitted:
-                if not new_email or not api_key or not pinecone_api_key:
-                    st.warning("Email, Cohere API key, and Pinecone API key are required")
-                else:
-                    success, result = st.session_state.db.register_user(new_email, "no_password_required", api_key, pinecone_api_key, is_admin)
-                    if success:
-                        st.success(f"Successfully registered user: {new_email}")
-                    else:
-                        st.error(result)
-        
-        # Display all users
-        st.subheader("Existing Users")
+    st.write(f"Delete every vector in the Pinecone index '{index_name}' by recreating it?")
+    if st.button("Reset", type="primary"):
         try:
-            users = st.session_state.db.get_all_users()
-            
-            if not users:
-                st.info("No users found.")
-            else:
-                user_data = []
-                for user in users:
-                    user_id, email, is_admin, created_at, last_login = user
-                    user_data.append({
-                        "Email": email,
-                        "Admin": "✅" if is_admin else "❌",
-                        "Created": created_at.strftime("%Y-%m-%d %H:%M") if created_at else "N/A",
-                        "Last Login": last_login.strftime("%Y-%m-%d %H:%M") if last_login else "Never"
-                    })
-                
-                import pandas as pd
-                df = pd.DataFrame(user_data)
-                st.dataframe(df)
+            pc = _get_pc(api_key)
+            with st.spinner("Resetting index..."):
+                if index_name in _index_names(api_key):
+                    pc.delete_index(index_name)
+                pc.create_index(
+                    name=index_name,
+                    dimension=768,
+                    metric='cosine',
+                    spec=ServerlessSpec(cloud='aws', region=environment)
+                )
+            _invalidate_index_caches()
+            _invalidate_answer_caches(index_name)
+            # Refresh the UI with the updated index list
+            st.rerun()
         except Exception as e:
-            st.error(f"Error loading users: {str(e)}")
+            st.error(f"Error resetting Pinecone index: {str(e)}")
+
+@st.fragment
+def _render_user_management():
+    """Render the user registration form and the list of existing users"""
+    import pandas as pd
     
-    # Pinecone API Key Management Tab
-    with admin_tabs[1]:
-        st.subheader("Manage Pinecone API Keys")
+    st.subheader("Manage Users")
+    
+    # Form to add new users
+    with st.form("add_user_form"):
+        st.subheader("Register New User")
+        new_email = st.text_input("Email")
+        is_admin = st.checkbox("Admin privileges")
+        api_key = st.text_input("Cohere API Key", help="Enter Cohere API key to be used by this user")
+        pinecone_api_key = st.text_input("Pinecone API Key", help="Enter Pinecone API key to be used by this user")
         
-        # Select user to update Pinecone API key
-        user_emails = [user[1] for user in st.session_state.db.get_all_users()]
-        selected_email = st.selectbox("Select User", user_emails)
+        submitted = st.form_submit_button("Add User", type="primary")
         
-        if selected_email:
-            user_id = [user[0] for user in st.session_state.db.get_all_users() if user[1] == selected_email][0]
-            current_pinecone_api_key = st.session_state.db.get_pinecone_api_key(user_id)
-            
-            st.markdown(f"**Current Pinecone API Key:** `{current_pinecone_api_key}`")
-            
-            new_pinecone_api_key = st.text_input("New Pinecone API Key", type="password")
-            
-            if st.button("Update Pinecone API Key", type="primary"):
-                success, message = st.session_state.db.update_pinecone_api_key(user_id, new_pinecone_api_key, st.session_state.user_id)
+        if submitted:
+            if not new_email or not api_key or not pinecone_api_key:
+                st.warning("Email, Cohere API key, and Pinecone API key are required")
+            else:
+                success, result = st.session_state.db.register_user(new_email, "no_password_required", api_key, pinecone_api_key, is_admin)
                 if success:
-                    st.success(message)
+                    _invalidate_user_caches()
+                    st.success(f"Successfully registered user: {new_email}")
                 else:
-                    st.error(message)
+                    st.error(result)
     
-    # Knowledge Base Management Tab
-    with admin_tabs[2]:
-        st.subheader("Manage Knowledge Base")
+    # Display all users
+    st.subheader("Existing Users")
+    try:
+        users = _all_users(st.session_state.db)
+        
+        if not users:
+            st.info("No users found.")
+        else:
+            # Build rows as tuples with explicit columns instead of one dict per user
+            user_data = [
+                (
+                    email,
+                    "✅" if is_admin else "❌",
+                    created_at.strftime("%Y-%m-%d %H:%M") if created_at else "N/A",
+                    last_login.strftime("%Y-%m-%d %H:%M") if last_login else "Never"
+                )
+                for _, email, is_admin, created_at, last_login in users
+            ]
+            
+            df = pd.DataFrame(user_data, columns=["Email", "Admin", "Created", "Last Login"])
+            st.dataframe(df)
+    except Exception as e:
+        st.error(f"Error loading users: {str(e)}")
 
-        # Pinecone API Key Input
-        pinecone_api_key = st.text_input("Enter Pinecone API Key", type="password", key="pinecone_api_key")
-        pinecone_environment = st.text_input("Enter Pinecone Environment (e.g., us-east-1)", key="pinecone_env")
-        index_name = st.text_input("Enter Pinecone Index Name", key="pinecone_index_name")
+@st.fragment
+def _render_pinecone_key_management():
+    """Render the per-user Pinecone API key editor"""
+    st.subheader("Manage Pinecone API Keys")
+    
+    # Select user to update Pinecone API key
+    email_to_id = {user[1]: user[0] for user in _all_users(st.session_state.db)}
+    selected_email = st.selectbox("Select User", list(email_to_id))
+    
+    if selected_email:
+        user_id = email_to_id[selected_email]
+        current_pinecone_api_key = st.session_state.db.get_pinecone_api_key(user_id)
         
-        if pinecone_api_key and pinecone_environment and index_name:
-            try:
-                # Initialize Pinecone
-                index = initialize_pinecone(pinecone_api_key, pinecone_environment, index_name)
-                if index:
-                    st.success("Pinecone initialized successfully.")
-            except Exception as e:
-                st.error(f"Error initializing Pinecone: {str(e)}")
-                return
+        st.markdown(f"**Current Pinecone API Key:** `{current_pinecone_api_key}`")
         
-        # File Upload Section
-        uploaded_file = st.file_uploader("Upload a Markdown (.md) file", type=["md"])
-        if uploaded_file:
-            if not st.session_state.get("is_admin", False):
-                st.error("Only admins can upload files.")
+        new_pinecone_api_key = st.text_input("New Pinecone API Key", type="password")
+        
+        if st.button("Update Pinecone API Key", type="primary"):
+            success, message = st.session_state.db.update_pinecone_api_key(user_id, new_pinecone_api_key, st.session_state.user_id)
+            if success:
+                _invalidate_user_caches()
+                st.success(message)
             else:
-                # Progress tracking containers
-                progress_container = st.container()
-                with progress_container:
-                    # Overall progress bar
-                    progress_bar = st.progress(0, text="Preparing file upload...")
-                    
-                    # Batch processing status
-                    batch_status = st.empty()
-                    batch_details = st.empty()
+                st.error(message)
+
+@st.fragment
+def _render_knowledge_base():
+    """Render the knowledge base upload and index reset controls"""
+    is_admin_user = st.session_state.get("is_admin", False)
+    st.subheader("Manage Knowledge Base")
+
+    # Pinecone API Key Input
+    pinecone_api_key = st.text_input("Enter Pinecone API Key", type="password", key="pinecone_api_key")
+    pinecone_environment = st.text_input("Enter Pinecone Environment (e.g., us-east-1)", key="pinecone_env")
+    index_name = st.text_input("Enter Pinecone Index Name", key="pinecone_index_name")
+    
+    if pinecone_api_key and pinecone_environment and index_name:
+        try:
+            # Initialize Pinecone
+            index = initialize_pinecone(pinecone_api_key, pinecone_environment, index_name)
+            if index:
+                st.success("Pinecone initialized successfully.")
+        except Exception as e:
+            st.error(f"Error initializing Pinecone: {str(e)}")
+            return
+    
+    # File Upload Section; the file is only processed when the form is submitted, so
+    # editing a setting or clicking another button never re-embeds it
+    with st.form("upload_form"):
+        # Ingestion tuning for large uploads; the defaults suit most files
+        with st.expander("Advanced ingestion settings"):
+            upsert_batch_size = st.number_input(
+                "Upsert batch size", min_value=1, max_value=1000, value=100,
+                help="Vectors per Pinecone upsert request. Batches over 2 MB are split automatically."
+            )
+            embed_batch_size = st.number_input(
+                "Embedding batch size", min_value=1, max_value=512, value=32,
+                help="Chunks encoded by the embedding model at once."
+            )
+        
+        uploaded_file = st.file_uploader("Upload a Markdown (.md) file", type=["md"])
+        upload_submitted = st.form_submit_button("Upload", type="primary")
+    
+    if upload_submitted and not uploaded_file:
+        st.warning("Choose a Markdown file to upload.")
+    elif upload_submitted:
+        if not is_admin_user:
+            st.error("Only admins can upload files.")
+        else:
+            # Progress tracking containers
+            progress_container = st.container()
+            with progress_container:
+                # Overall progress bar
+                progress_bar = st.progress(0, text="Preparing file upload...")
                 
-                try:
-                    # Read and process file
-                    md_text = uploaded_file.read().decode("utf-8")
+                # Batch processing status
+                batch_status = st.empty()
+            
+            try:
+                # Reject empty and whitespace-only files before paying for the decode. isspace() stops
+                # at the first non-blank byte and, unlike strip(), never copies the upload
+                if uploaded_file.size == 0:
+                    raise ValueError("The uploaded file is empty.")
+                if uploaded_file.getvalue().isspace():
+                    raise ValueError("The uploaded file appears to contain only whitespace.")
+                
+                # Parse and chunk the markdown; the status shows while it runs
+                with st.status("Chunking markdown...") as chunk_status:
+                    chunks = _parse_and_chunk(uploaded_file.getvalue())
+                    chunk_status.update(label=f"Created {len(chunks)} chunks", state="complete")
+                
+                if not chunks:
+                    raise ValueError("No valid content chunks could be generated.")
+                
+                # Pinecone embedding configuration
+                if pinecone_api_key and pinecone_environment and index_name:
+                    # Each progress update is a websocket round-trip, so throttle to ~2 per second
+                    last_progress_update = 0.0
                     
-                    if len(md_text.strip()) == 0:
-                        raise ValueError("The uploaded file is empty.")
+                    # Detailed progress callback
+                    def progress_callback(current_batch, total_batches, batch_size, batch_progress):
+                        nonlocal last_progress_update
+                        now = time.monotonic()
+                        is_last_batch = batch_progress['processed_chunks'] >= batch_progress['total_chunks']
+                        if not is_last_batch and now - last_progress_update < 0.5:
+                            return
+                        last_progress_update = now
+                        
+                        # Calculate overall progress percentage
+                        progress_percentage = int((batch_progress['processed_chunks'] / batch_progress['total_chunks']) * 100)
+                        
+                        # Update progress bar
+                        progress_bar.progress(
+                            progress_percentage, 
+                            text=f"Processing Embeddings: {batch_progress['processed_chunks']}/{batch_progress['total_chunks']} chunks"
+                        )
+                        
+                        # Update batch status in a single element
+                        batch_status.markdown(
+                            f"**Batch {current_batch}/{total_batches}** — "
+                            f"processing batch of {batch_size} chunks. "
+                            f"Total chunks processed: {batch_progress['processed_chunks']}"
+                        )
                     
-                    # Parse markdown
-                    parsed_data = parse_markdown(md_text)
+                    # Imported on first upload; pulls in torch and sentence-transformers
+                    from embedding import generate_and_store_embeddings
                     
-                    # Chunk content
-                    chunks = chunk_content(parsed_data, max_tokens=500)
+                    # Spinner with embedding generation
+                    with st.spinner("Generating semantic embeddings..."):
+                        # A pooled handle lets the batches upsert in parallel
+                        embedding_stats = generate_and_store_embeddings(
+                            chunks, 
+                            _get_index(pinecone_api_key, index_name, pool_threads=30), 
+                            upsert_batch_size=int(upsert_batch_size),
+                            embed_batch_size=int(embed_batch_size),
+                            progress_callback=progress_callback,
+                            embedding_cache=st.session_state.db,
+                            source=uploaded_file.name
+                        )
                     
-                    if not chunks:
-                        raise ValueError("No valid content chunks could be generated.")
+                    # Answers cached before this upload may be outdated, even if some batches failed
+                    _invalidate_answer_caches(index_name)
                     
-                    # Pinecone embedding configuration
-                    if pinecone_api_key and pinecone_environment and index_name:
-                        # Detailed progress callback
-                        def progress_callback(current_batch, total_batches, batch_size, batch_progress):
-                            # Calculate overall progress percentage
-                            progress_percentage = int((batch_progress['processed_chunks'] / batch_progress['total_chunks']) * 100)
-                            
-                            # Update progress bar
-                            progress_bar.progress(
-                                progress_percentage, 
-                                text=f"Processing Embeddings: {batch_progress['processed_chunks']}/{batch_progress['total_chunks']} chunks"
-                            )
-                            
-                            # Update batch status
-                            batch_status.markdown(f"**Batch {current_batch}/{total_batches}**")
-                            batch_details.caption(
-                                f"Processing batch of {batch_size} chunks. "
-                                f"Total chunks processed: {batch_progress['processed_chunks']}"
-                            )
-                        
-                        # Spinner with embedding generation
-                        with st.spinner("Generating semantic embeddings..."):
-                            embedding_stats = generate_and_store_embeddings(
-                                chunks, 
-                                index, 
-                                progress_callback=progress_callback
-                            )
-                        
+                    # Report failed batches instead of a success when vectors are missing
+                    if embedding_stats['errors']:
+                        st.error(
+                            f"Upload incomplete: {embedding_stats['failed_vectors']} of "
+                            f"{embedding_stats['total_chunks']} chunks were not stored in Pinecone."
+                        )
+                        with st.expander("Failed batches"):
+                            for error in embedding_stats['errors']:
+                                st.text(error)
+                    else:
                         # Final success message
                         st.success(
                             f"Upload complete! "
                             f"Processed {embedding_stats['total_chunks']} chunks "
                             f"in {embedding_stats['total_batches']} batches."
                         )
-                    
-                    else:
-                        raise ValueError("Invalid Pinecone configuration")
                 
-                except Exception as e:
-                    st.error(f"Upload failed: {str(e)}")
-        
-        # Reset Pinecone Index Button
-        if st.button("Reset Pinecone Index", key="reset_pinecone"):
-            if not st.session_state.get("is_admin", False):
-                st.error("Only admins can reset the Pinecone index.")
-            else:
-                try:
-                    pc = Pinecone(api_key=pinecone_api_key)
-                    if index_name in [index.name for index in pc.list_indexes()]:
-                        pc.delete_index(index_name)
-                    pc.create_index(
-                        name=index_name,
-                        dimension=768,
-                        metric='cosine',
-                        spec=ServerlessSpec(cloud='aws', region=pinecone_environment)
-                    )
-                    st.success("Pinecone index reset successfully.")
-                except Exception as e:
-                    st.error(f"Error resetting Pinecone index: {str(e)}")
-
-    # New Tab: Pinecone Index Management
-    with admin_tabs[3]:
-        st.subheader("Pinecone Index Management")
+                else:
+                    raise ValueError("Invalid Pinecone configuration")
+            
+            except Exception as e:
+                st.error(f"Upload failed: {str(e)}")
     
-        # Get admin's Pinecone API key
-        user_details = st.session_state.db.get_user_details(st.session_state.user_id)
-        pinecone_api_key = user_details.get('pinecone_api_key')
+    # Uploads made before vectors were keyed on their content used position-based ids, so
+    # re-uploading those files left the old vectors behind as duplicates
+    if st.button("Remove legacy vectors", key="remove_legacy_vectors",
+                 help="Delete vectors stored under the old chunk_<batch>_<n> ids. "
+                      "Re-upload the affected files first so their content is kept."):
+        if not is_admin_user:
+            st.error("Only admins can remove vectors.")
+        elif pinecone_api_key and index_name:
+            try:
+                deleted = _delete_legacy_vectors(pinecone_api_key, index_name)
+                _invalidate_answer_caches(index_name)
+                st.success(f"Removed {deleted} legacy vectors from '{index_name}'.")
+            except Exception as e:
+                st.error(f"Error removing legacy vectors: {str(e)}")
     
-        if not pinecone_api_key:
-            st.error("Pinecone API key not found for your account.")
+    # Reset Pinecone Index Button
+    if st.button("Reset Pinecone Index", key="reset_pinecone"):
+        if not is_admin_user:
+            st.error("Only admins can reset the Pinecone index.")
         else:
-            # Initialize Pinecone client
-            try:
-                pc = Pinecone(api_key=pinecone_api_key)
+            _confirm_reset_index(pinecone_api_key, pinecone_environment, index_name)
+
+@st.fragment
+def _render_index_management():
+    """Render index creation, the index overview, and default/delete controls"""
+    import pandas as pd
+    from pinecone import ServerlessSpec
+    
+    st.subheader("Pinecone Index Management")
+
+    # Get admin's Pinecone API key
+    user_details = _user_details(st.session_state.db, st.session_state.user_id)
+    pinecone_api_key = user_details.get('pinecone_api_key')
+
+    if not pinecone_api_key:
+        st.error("Pinecone API key not found for your account.")
+    else:
+        # Initialize Pinecone client
+        try:
+            pc = _get_pc(pinecone_api_key)
+        
+            # 1. Index Creation Section
+            st.markdown("### 🔨 Create New Index")
+            with st.form("create_index_form"):
+                new_index_name = st.text_input("New Index Name", help="Use lowercase letters, numbers, or hyphens")
+                dimension = st.selectbox("Vector Dimension", [768], index=0)
+                region = st.selectbox("Region", ["us-east-1"], index=0)
             
-                # 1. Index Creation Section
-                st.markdown("### 🔨 Create New Index")
-                with st.form("create_index_form"):
-                    new_index_name = st.text_input("New Index Name", help="Use lowercase letters, numbers, or hyphens")
-                    dimension = st.selectbox("Vector Dimension", [768], index=0)
-                    region = st.selectbox("Region", ["us-east-1"], index=0)
-                
-                    create_submitted = st.form_submit_button("Create Index", type="primary")
-                
-                    if create_submitted:
-                        try:
-                            if not re.match(r'^[a-z0-9\-]+$', new_index_name):
-                                st.error("Invalid index name. Use only lowercase letters, numbers, or hyphens.")
-                            else:
-                                # Check if index already exists
-                                existing_indexes = [index.name for index in pc.list_indexes()]
-                                if new_index_name in existing_indexes:
-                                    st.error(f"Index '{new_index_name}' already exists.")
-                                else:
-                                    # Create new index
-                                    pc.create_index(
-                                        name=new_index_name,
-                                        dimension=dimension,
-                                        metric='cosine',
-                                        spec=ServerlessSpec(cloud='aws', region=region)
-                                    )
-                                    st.success(f"Created new Pinecone index '{new_index_name}'.")
-                                    st.rerun()
-                        except Exception as e:
-                            st.error(f"Error creating index: {str(e)}")
+                create_submitted = st.form_submit_button("Create Index", type="primary")
             
-                # 2. Manage Existing Indexes with Dropdown
-                st.markdown("### 📊 Manage Existing Indexes")
+                if create_submitted:
+                    try:
+                        if not _INDEX_NAME_RE.fullmatch(new_index_name):
+                            st.error("Invalid index name. Use only lowercase letters, numbers, or hyphens.")
+                        else:
+                            # Check if index already exists
+                            if new_index_name in _index_names(pinecone_api_key):
+                                st.error(f"Index '{new_index_name}' already exists.")
+                            else:
+                                # Create new index
+                                pc.create_index(
+                                    name=new_index_name,
+                                    dimension=dimension,
+                                    metric='cosine',
+                                    spec=ServerlessSpec(cloud='aws', region=region)
+                                )
+                                _invalidate_index_caches()
+                                st.success(f"Created new Pinecone index '{new_index_name}'.")
+                                st.rerun(scope="fragment")
+                    except Exception as e:
+                        st.error(f"Error creating index: {str(e)}")
+        
+            # 2. Manage Existing Indexes with Dropdown
+            st.markdown("### 📊 Manage Existing Indexes")
+        
+            # Get list of indexes
+            try:
+                indexes = _list_indexes(pinecone_api_key)
+                index_hosts = dict(indexes)
+                index_names = list(index_hosts)
             
-                # Get list of indexes
-                try:
-                    indexes = pc.list_indexes()
-                    index_names = [index.name for index in indexes]
+                if not index_names:
+                    st.info("No Pinecone indexes found in your account.")
+                else:
+                    # Overview of all indexes, with stats prefetched in parallel
+                    stats_map = _index_stats_map(pinecone_api_key, indexes)
+                    st.dataframe(pd.DataFrame(
+                        [
+                            (
+                                name,
+                                stats_map[name].get("total_vector_count", "N/A"),
+                                stats_map[name].get("dimension", "N/A"),
+                            )
+                            for name in index_names
+                        ],
+                        columns=["Index", "Vectors", "Dimension"]
+                    ))
+                    for name in index_names:
+                        if "error" in stats_map[name]:
+                            st.warning(f"Could not fetch stats for index '{name}': {stats_map[name]['error']}")
                 
-                    if not index_names:
-                        st.info("No Pinecone indexes found in your account.")
-                    else:
-                        # 1. Set Default Index
-                        st.markdown("#### Set Default Index")
-                        selected_default_index = st.selectbox(
-                            "Select an index to set as default:",
-                            index_names,
-                            key="default_index_dropdown"
-                        )
-                    
-                        # Get the region for the selected index
-                        selected_index_obj = next((idx for idx in indexes if idx.name == selected_default_index), None)
-                        if selected_index_obj and selected_index_obj.host:
-                            selected_region = selected_index_obj.host.split('.')[2]  # Extract region from host
-                        
-                            if st.button("Set as Default Index", type="primary"):
-                                try:
-                                    success, message = st.session_state.db.set_default_pinecone_index(
-                                        selected_default_index, 
-                                        selected_region
-                                    )
-                                    if success:
-                                        st.success(message)
-                                    else:
-                                        st.error(message)
-                                except Exception as e:
-                                    st.error(f"Error setting default: {str(e)}")
-                    
-                        # 2. Delete Index - FIXED SECTION
-                        st.markdown("#### Delete Index")
-                        index_to_delete = st.selectbox(
-                            "Select an index to delete:",
-                            index_names,
-                            key="delete_index_dropdown"
-                        )
+                    # 1. Set Default Index
+                    st.markdown("#### Set Default Index")
+                    selected_default_index = st.selectbox(
+                        "Select an index to set as default:",
+                        index_names,
+                        key="default_index_dropdown"
+                    )
+                
+                    # Get the region for the selected index
+                    selected_host = index_hosts.get(selected_default_index)
+                    if selected_host:
+                        selected_region = selected_host.split('.')[2]  # Extract region from host
                     
-                        # Direct delete button without confirmation step
-                        if st.button("Delete Selected Index", type="secondary"):
+                        if st.button("Set as Default Index", type="primary"):
                             try:
-                                pc.delete_index(index_to_delete)
-                                st.success(f"Deleted index '{index_to_delete}'.")
-                                # Force a rerun to refresh the UI with updated index list
-                                st.rerun()
+                                success, message = st.session_state.db.set_default_pinecone_index(
+                                    selected_default_index, 
+                                    selected_region
+                                )
+                                if success:
+                                    # Drop this session's connection so main() reconnects to the new
+                                    # default and rebuilds the RAG system for it on a full rerun
+                                    for key in ("user_bootstrap", "pinecone_index_name",
+                                                "pinecone_index_host", "rag_system"):
+                                        st.session_state.pop(key, None)
+                                    st.rerun()
+                                else:
+                                    st.error(message)
                             except Exception as e:
-                                st.error(f"Error deleting index: {str(e)}")
-                    
-                        # Display current default index
-                        try:
-                            current_default = st.session_state.db.get_default_pinecone_index(st.session_state.user_id)
-                            if current_default:
-                                st.info(f"**Current Default Index:** {current_default['index_name']} in region {current_default['environment']}")
-                            else:
-                                st.warning("No default index set yet.")
-                        except Exception as e:
-                            st.error(f"Error fetching default index: {str(e)}")
-            
-                except Exception as e:
-                    st.error(f"Error listing Pinecone indexes: {str(e)}")
+                                st.error(f"Error setting default: {str(e)}")
+                
+                    # 2. Delete Index - FIXED SECTION
+                    st.markdown("#### Delete Index")
+                    index_to_delete = st.selectbox(
+                        "Select an index to delete:",
+                        index_names,
+                        key="delete_index_dropdown"
+                    )
+                
+                    # Confirm in a modal dialog; only a confirmed delete reruns the page
+                    if st.button("Delete Selected Index", type="secondary"):
+                        _confirm_delete_index(pinecone_api_key, index_to_delete)
+                
+                    # Display current default index
+                    try:
+                        current_default = _default_index()
+                        if current_default:
+                            st.info(f"**Current Default Index:** {current_default['index_name']} in region {current_default['environment']}")
+                        else:
+                            st.warning("No default index set yet.")
+                    except Exception as e:
+                        st.error(f"Error fetching default index: {str(e)}")
         
             except Exception as e:
-                st.error(f"Error connecting to Pinecone: {str(e)}")
+                st.error(f"Error listing Pinecone indexes: {str(e)}")
     
-    # All Conversations Tab
-    with admin_tabs[4]:
-        st.subheader("All User Conversations")
+        except Exception as e:
+            st.error(f"Error connecting to Pinecone: {str(e)}")
+
+@st.fragment
+def _render_all_conversations():
+    """Render every user's conversations with open and delete actions"""
+    import pandas as pd
+    
+    st.subheader("All User Conversations")
+    
+    # Get the newest conversations (admin has access to all); fetch one extra row to know if there are more
+    try:
+        conversation_limit = st.session_state.get("admin_conversation_limit", ADMIN_CONVERSATION_PAGE_SIZE)
+        conversations = _all_conversations(st.session_state.db, st.session_state.user_id, conversation_limit + 1)
+        has_more_conversations = len(conversations) > conversation_limit
+        conversations = conversations[:conversation_limit]
         
-        # Get all conversations (admin has access to all)
-        try:
-            conversations = st.session_state.db.get_user_conversations(st.session_state.user_id, is_admin=True)
+        if not conversations:
+            st.info("No conversations found.")
+        else:
+            # One table with row selection instead of a row of widgets per conversation
+            conversation_table = st.dataframe(
+                pd.DataFrame(
+                    [
+                        (title, user_email, created_at.strftime("%Y-%m-%d"))
+                        for _, title, created_at, user_email in conversations
+                    ],
+                    columns=["Title", "User", "Created"]
+                ),
+                hide_index=True,
+                use_container_width=True,
+                on_select="rerun",
+                selection_mode="single-row",
+                key="admin_conversations_table"
+            )
             
-            if not conversations:
-                st.info("No conversations found.")
-            else:
-                # Display conversations in a table
-                for conv in conversations:
-                    conv_id, title, created_at, user_email = conv
-                    
-                    with st.container():
-                        cols = st.columns([3, 1, 1])
-                        
-                        with cols[0]:
-                            button_label = f"{title} ({user_email})"
-                            if len(button_label) > 40:
-                                button_label = button_label[:37] + "..."
-                            
-                            if st.button(button_label, key=f"admin_conv_{conv_id}", use_container_width=True):
-                                st.session_state.current_conversation_id = conv_id
-                                st.session_state.conversation_title = title
-                                st.session_state.viewing_as_admin = True
-                                load_conversation_messages()
-                                # Redirect to chat interface
-                                st.session_state.admin_view = False
-                                st.rerun()
-                        
-                        with cols[1]:
-                            # Format date
-                            st.text(created_at.strftime("%Y-%m-%d"))
-                        
-                        with cols[2]:
-                            if st.button("🗑️", key=f"admin_del_{conv_id}", help="Delete conversation"):
-                                st.session_state.db.delete_conversation(conv_id)
-                                st.rerun()
-        except Exception as e:
-            st.error(f"Error loading conversations: {str(e)}")
-def display_chat_interface():
-    """Display the chat interface"""
-    # Check if an index has been selected
-    if "pinecone_index_name" not in st.session_state:
-        select_pinecone_index()
-        return
+            selected_rows = conversation_table.selection.rows
+            if selected_rows and selected_rows[0] < len(conversations):
+                conv_id, title, _, user_email = conversations[selected_rows[0]]
+                cols = st.columns(2)
+                
+                with cols[0]:
+                    if st.button("Open conversation", type="primary", key="admin_open_conversation", use_container_width=True):
+                        st.session_state.current_conversation_id = conv_id
+                        st.session_state.conversation_title = title
+                        st.session_state.viewing_as_admin = True
+                        load_conversation_messages()
+                        # Redirect to chat interface
+                        st.session_state.admin_view = False
+                        st.rerun()
+                
+                with cols[1]:
+                    if st.button("🗑️ Delete conversation", key="admin_delete_conversation", use_container_width=True):
+                        st.session_state.db.delete_conversation(conv_id)
+                        _invalidate_conversation_caches()
+                        # Drop the selection so it doesn't land on the row that moves up
+                        st.session_state.pop("admin_conversations_table", None)
+                        st.rerun(scope="fragment")
+            
+            if has_more_conversations and st.button("Show more", key="admin_show_more_conversations"):
+                st.session_state.admin_conversation_limit = conversation_limit + ADMIN_CONVERSATION_PAGE_SIZE
+                st.rerun(scope="fragment")
+    except Exception as e:
+        st.error(f"Error loading conversations: {str(e)}")
+
+def display_admin_page():
+    """Display the admin dashboard with user management, Pinecone API key management, knowledge base management, and conversations."""
+    st.title("🔧 Admin Dashboard")
+    
+    # Each tab is its own fragment, so widget interactions and deletes only rerun that tab
+    # Create tabs for different admin functions
+    # Update tabs to include Pinecone Index Selection
+    admin_tabs = st.tabs([
+        "👥 User Management", 
+        "🔑 Pinecone API Key Management", 
+        "📚 Knowledge Base Management",
+        "🔍 Pinecone Index Management",  # New tab for Pinecone index management
+        "💬 All Conversations",
+    ])
+    
+    # User Management Tab
+    with admin_tabs[0]:
+        _render_user_management()
+    
+    # Pinecone API Key Management Tab
+    with admin_tabs[1]:
+        _render_pinecone_key_management()
+    
+    # Knowledge Base Management Tab
+    with admin_tabs[2]:
+        _render_knowledge_base()
+    
+    # New Tab: Pinecone Index Management
+    with admin_tabs[3]:
+        _render_index_management()
     
-    # Rest of the chat interface remains unchanged
+    # All Conversations Tab
+    with admin_tabs[4]:
+        _render_all_conversations()
+
+@st.fragment
+def _conversation_title():
+    """Render the conversation title form; submitting it reruns only this fragment"""
     with st.container():
         cols = st.columns([3, 1])
         
         with cols[0]:
             current_title = st.session_state.get("conversation_title", "New Chat")
-            new_title = st.text_input(
-                "💬 Conversation Title", 
-                value=current_title,
-                key=f"title_input_{st.session_state.current_conversation_id}"
-            )
+            # A form only submits on the Rename button, so typing doesn't trigger reruns
+            with st.form(f"rename_form_{st.session_state.current_conversation_id}", border=False):
+                new_title = st.text_input(
+                    "💬 Conversation Title", 
+                    value=current_title,
+                    key=f"title_input_{st.session_state.current_conversation_id}"
+                )
+                submitted = st.form_submit_button("Rename")
             
-            if new_title != current_title and new_title.strip():
+            if submitted and new_title != current_title and new_title.strip():
                 try:
-                    st.session_state.db.rename_conversation(st.session_state.current_conversation_id, new_title)
+                    # An unsaved chat just keeps the title for when its row is created
+                    if st.session_state.current_conversation_id is not None:
+                        st.session_state.db.rename_conversation(st.session_state.current_conversation_id, new_title)
+                        _invalidate_conversation_caches()
                     st.session_state.conversation_title = new_title
+                    # The sidebar lists titles too, so this one still reruns the whole page
                     st.rerun()
                 except Exception as e:
                     st.error(f"Failed to update title: {e}")
+
+def _show_older_messages():
+    st.session_state.visible_count = st.session_state.get("visible_count", MESSAGE_PAGE_SIZE) + MESSAGE_PAGE_SIZE
+
+def _render_sources(sources):
+    if sources:
+        with st.expander("Sources"):
+            for i, source in enumerate(sources):
+                st.markdown(f"**Source {i+1}**: {source}")
+
+def _stream_response(typing_placeholder, prompt, chat_history):
+    """Stream a RAG response into the placeholder and return the full text with its sources"""
+    stream, sources = st.session_state.rag_system.generate_response_stream(prompt, chat_history)
     
-    st.markdown("---")
+    response_placeholder = typing_placeholder.empty()
+    # Collect deltas in a list and join only when rendering, rather than rebuilding the string per token
+    parts = []
+    # Coalesce deltas so the placeholder redraws at most every 50 ms
+    last_render = time.monotonic()
+    
+    for event in stream:
+        if hasattr(event, "type") and event.type == "content-delta":
+            delta_text = event.delta.message.content.text
+            parts.append(delta_text)
+            now = time.monotonic()
+            if now - last_render > 0.05:
+                response_placeholder.markdown("".join(parts) + "▌")
+                last_render = now
+        
+        if hasattr(event, "type") and event.type == "message-end":
+            response_placeholder.markdown("".join(parts))
+            _render_sources(sources)
+    
+    return "".join(parts), sources
+
+def _answer_prompt(prompt, chat_history, bypass_cache=False):
+    """Render the assistant's answer to the prompt and return its text"""
+    typing_placeholder = st.empty()
+    typing_placeholder.markdown("*Thinking...*")
+    
+    # Near-duplicate questions asked in the same context are answered from the semantic cache
+    semantic_cache = _get_semantic_cache()
+    index_name = st.session_state.pinecone_index_name
+    cache_namespace = f"{index_name}:{st.session_state.user_id}"
+    cache_state_key = semantic_cache.build_state_key(chat_history[:-1])
+    
+    # Exact repeats within the session are answered from memory, skipping even the prompt embedding
+    if "response_cache" not in st.session_state:
+        st.session_state.response_cache = OrderedDict()
+    response_cache = st.session_state.response_cache
+    exact_key = (cache_namespace, _knowledge_base_versions().get(index_name, 0), cache_state_key, prompt)
+    
+    cached = None
+    prompt_embedding = None
+    if not bypass_cache:
+        cached = response_cache.get(exact_key)
+        if cached is None:
+            # The cache keys on the bare prompt; the conversation context is already in the state key,
+            # so a lookup never pays for the retrieval query's key-topics call
+            prompt_embedding = st.session_state.rag_system.embedding_model.encode(prompt)
+            cached = semantic_cache.lookup(cache_namespace, cache_state_key, prompt_embedding)
+    
+    if cached:
+        full_response, sources = cached
+        typing_placeholder.markdown(full_response)
+        _render_sources(sources)
+    else:
+        full_response, sources = _stream_response(typing_placeholder, prompt, chat_history)
+        # Only cache grounded answers; errors and no-context replies come back without sources
+        if not bypass_cache and full_response and sources:
+            semantic_cache.store(cache_namespace, cache_state_key, prompt_embedding, full_response, sources)
+            cached = (full_response, sources)
+    
+    if cached and not bypass_cache:
+        # Least recently used entries are evicted first
+        response_cache[exact_key] = cached
+        response_cache.move_to_end(exact_key)
+        if len(response_cache) > RESPONSE_CACHE_SIZE:
+            response_cache.popitem(last=False)
     
+    return full_response
+
+def _save_unanswered_prompt(chat_history, prompt):
+    """Store a prompt that got no reply and give its in-memory entry the new message id"""
+    message_id = st.session_state.db.add_message(
+        st.session_state.current_conversation_id,
+        st.session_state.user_id,
+        True,  # is_user
+        prompt
+    )
+    chat_history[-1] = chat_history[-1]._replace(message_id=message_id)
+
+@st.fragment
+def _chat_fragment():
+    """Render the transcript and handle new prompts without rerunning the rest of the page"""
     chat_container = st.container()
     
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-        if "chat_messages" in st.session_state and st.session_state.chat_messages:
-            for msg in st.session_state.chat_messages:
-                is_user = msg[1]
-                content = msg[2]
-                role = "user" if is_user else "assistant"
-                st.session_state.messages.append({"role": role, "content": content})
+    if "chat_history" not in st.session_state:
+        st.session_state.chat_history = []
+    chat_history = st.session_state.chat_history
     
     with chat_container:
-        if not st.session_state.messages:
+        if not chat_history:
             st.info("👋 Welcome! Ask me anything about Golden Gate Ventures.")
         
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"], avatar="👤" if message["role"] == "user" else "🤖"):
-                st.markdown(message["content"])
+        # Only render the tail of long conversations; older messages are revealed on demand
+        visible_count = st.session_state.get("visible_count", MESSAGE_PAGE_SIZE)
+        if len(chat_history) > visible_count:
+            st.button("⬆️ Load older messages", on_click=_show_older_messages, key="load_older_messages")
+        
+        for message in chat_history[-visible_count:]:
+            role = "user" if message.is_user else "assistant"
+            with st.chat_message(role, avatar="👤" if message.is_user else "🤖"):
+                st.markdown(message.content)
     
     st.markdown("---")
     prompt = st.chat_input("Type your message...", key="chat_input")
     
     if prompt:
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        # The flag only steers this answer past the caches; the question is stored without it
+        bypass_cache = prompt.startswith(NOCACHE_FLAG)
+        if bypass_cache:
+            prompt = prompt[len(NOCACHE_FLAG):].strip()
         
         with st.chat_message("user", avatar="👤"):
             st.markdown(prompt)
         
-        st.session_state.db.add_message(
-            st.session_state.current_conversation_id,
-            st.session_state.user_id,
-            True,  # is_user
-            prompt
-        )
-        
-        all_messages = st.session_state.db.get_conversation_messages(st.session_state.current_conversation_id)
-        st.session_state.chat_messages = all_messages
-        st.session_state.chat_history = all_messages
+        # The first message of a new chat creates its conversation row
+        conversation_created = _save_pending_conversation()
         
-        chat_history = [(msg[0], msg[1], msg[2], msg[3]) for msg in st.session_state.chat_history]
+        # Keep the in-memory history in step with the DB instead of refetching the conversation;
+        # the prompt's id is filled in once the exchange is saved
+        prompt_time = datetime.now()
+        chat_history.append(Message(None, True, prompt, prompt_time))
         
-        with st.chat_message("assistant", avatar="🤖"):
-            typing_placeholder = st.empty()
-            typing_placeholder.markdown("*Thinking...*")
-            
-            stream, sources = st.session_state.rag_system.generate_response_stream(prompt, chat_history)
-            
-            response_placeholder = typing_placeholder.empty()
-            full_response = ""
-            
-            for event in stream:
-                if hasattr(event, "type") and event.type == "content-delta":
-                    delta_text = event.delta.message.content.text
-                    full_response += delta_text
-                    response_placeholder.markdown(full_response + "▌")
-                    time.sleep(0.01)
-                
-                if hasattr(event, "type") and event.type == "message-end":
-                    response_placeholder.markdown(full_response)
-                    
-                    if sources:
-                        with st.expander("Sources"):
-                            for i, source in enumerate(sources):
-                                st.markdown(f"**Source {i+1}**: {source}")
-            
-            st.session_state.db.add_message(
-                st.session_state.current_conversation_id,
-                st.session_state.user_id,
-                False,  # is_user
-                full_response
-            )
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
+        full_response = None
+        prompt_saved = False
+        try:
+            with st.chat_message("assistant", avatar="🤖"):
+                full_response = _answer_prompt(prompt, chat_history, bypass_cache)
+        except Exception as e:
+            _save_unanswered_prompt(chat_history, prompt)
+            prompt_saved = True
+            st.error(f"Error generating response: {str(e)}")
+            return
+        finally:
+            if full_response is None and not prompt_saved:
+                # A rerun or stop interrupted the response; still record what the user asked
+                _save_unanswered_prompt(chat_history, prompt)
         
-        st.session_state.chat_messages.append((str(uuid.uuid4()), True, prompt, datetime.now()))
-        st.session_state.chat_messages.append((str(uuid.uuid4()), False, full_response, datetime.now()))
-def custom_css():
-    st.markdown("""
+        # Save the prompt and the response together in one transaction; one clock read stamps
+        # the reply both in the database and in memory
+        response_time = datetime.now()
+        user_message_id, assistant_message_id = st.session_state.db.add_message_pair(
+            st.session_state.current_conversation_id,
+            st.session_state.user_id,
+            prompt,
+            full_response,
+            user_timestamp=prompt_time,
+            assistant_timestamp=response_time
+        )
+        chat_history[-1] = chat_history[-1]._replace(message_id=user_message_id)
+        chat_history.append(Message(assistant_message_id, False, full_response, response_time))
+        # The lists are shared by every session, so a reply is not worth flushing them for;
+        # its updated_at reordering shows up once their TTL expires
+        if conversation_created:
+            # The sidebar lives outside this fragment; redraw the page so it lists the new chat
+            st.rerun()
+
+def display_chat_interface():
+    """Display the chat interface"""
+    # Check if an index has been selected
+    if "pinecone_index_name" not in st.session_state:
+        select_pinecone_index()
+        return
+    
+    # Report a conversation that failed to open before the rerun that replaced it
+    conversation_error = st.session_state.pop("conversation_error", None)
+    if conversation_error:
+        st.error(conversation_error)
+    
+    _conversation_title()
+    
+    st.markdown("---")
+    
+    _chat_fragment()
+
+# Built once at import instead of on every rerun
+_CSS = """
     <style>
     /* Main app styling */
     .main {
@@ -914,7 +1422,10 @@ def custom_css():
         color: var(--text-color) !important;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+def custom_css():
+    st.markdown(_CSS, unsafe_allow_html=True)
 
 # You may also need to update init_db in main() function
 def main():
@@ -949,24 +1460,27 @@ def main():
         # If no index is selected yet and the user is authenticated, check for default index
         if "pinecone_index_name" not in st.session_state:
             try:
-                # Try to get the default index from database
-                default_index = st.session_state.db.get_default_pinecone_index(st.session_state.user_id)
+                # Get user details and the default index in one query, once per session
+                user_details = _user_bootstrap()
+                default_index = user_details.get("default_index")
                 
                 if default_index:
-                    # Get user details to get API key
-                    user_details = st.session_state.db.get_user_details(st.session_state.user_id)
                     pinecone_api_key = user_details.get('pinecone_api_key')
                     
                     if pinecone_api_key:
                         # Set the index name in session state
                         st.session_state.pinecone_index_name = default_index['index_name']
                         
+                        # Resolve the index host once so later connections skip the lookup
+                        st.session_state.pinecone_index_host = _index_host(pinecone_api_key, default_index['index_name'])
+                        
                         # Initialize RAGSystem with the default index
-                        st.session_state.rag_system = RAGSystem(
-                            api_key=user_details["api_key"],
-                            pinecone_api_key=pinecone_api_key,
-                            pinecone_environment=default_index.get('environment', 'us-east-1'),
-                            index_name=default_index['index_name']
+                        st.session_state.rag_system = _build_rag(
+                            user_details["api_key"],
+                            pinecone_api_key,
+                            default_index.get('environment', 'us-east-1'),
+                            default_index['index_name'],
+                            st.session_state.pinecone_index_host
                         )
                         
                         st.success(f"Connected to default Pinecone index: {default_index['index_name']}")
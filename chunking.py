@@ -1,17 +1,30 @@
+import functools
+import io
+import os
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import tiktoken
 
-# Initialize the tokenizer
-tokenizer = tiktoken.get_encoding("cl100k_base")
+@functools.lru_cache(maxsize=1)
+def _get_tokenizer():
+    """Load the tokenizer on first use and reuse it for the life of the process"""
+    return tiktoken.get_encoding("cl100k_base")
 
 # Regex pattern for main headings
 MAIN_HEADING_PATTERN = re.compile(r"^# (?!\*)(.+)", re.MULTILINE)
 
+# Block and sentence boundaries used when chunking. Both are linear-time: the only
+# lookbehind is a single fixed-width character class, so nothing can backtrack
+BLOCK_SPLIT_PATTERN = re.compile(r"\n+")
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
 def count_tokens(text):
-    return len(tokenizer.encode(text))
+    return len(_get_tokenizer().encode_ordinary(text))
 
 def split_text_by_tokens(text, max_tokens):
-    tokens = tokenizer.encode(text)
+    tokenizer = _get_tokenizer()
+    tokens = tokenizer.encode_ordinary(text)
     splits = []
     for i in range(0, len(tokens), max_tokens):
         chunk_tokens = tokens[i:i+max_tokens]
@@ -19,65 +32,68 @@ def split_text_by_tokens(text, max_tokens):
         splits.append(chunk_text)
     return splits
 
-def parse_markdown(md_text):
-    structured_data = []
-    parts = re.split(MAIN_HEADING_PATTERN, md_text)
-    if not parts or len(parts) < 2:
-        return [{"main_heading": "", "content": md_text.strip()}]
+def parse_markdown(md_source):
+    """
+    Yield {"main_heading", "content"} sections split on main headings.
 
-    parts = parts[1:]
-    for i in range(0, len(parts), 2):
-        main_heading = parts[i].strip()
-        content = parts[i + 1].strip() if (i + 1) < len(parts) else ""
-        structured_data.append({
-            "main_heading": main_heading,
-            "content": content
-        })
-    return structured_data
+    md_source may be a string or any iterable of lines (e.g. a text stream over an upload),
+    so large files are parsed one section at a time instead of being held in memory whole.
+    Text before the first main heading is dropped; a file without main headings is one section.
+    """
+    lines = io.StringIO(md_source) if isinstance(md_source, str) else md_source
+    main_heading = None
+    content_lines = []
+    for line in lines:
+        match = MAIN_HEADING_PATTERN.match(line)
+        if match:
+            if main_heading is not None:
+                yield {
+                    "main_heading": main_heading,
+                    "content": "".join(content_lines).strip()
+                }
+            main_heading = match.group(1).strip()
+            content_lines = []
+        else:
+            content_lines.append(line)
+
+    yield {
+        "main_heading": main_heading or "",
+        "content": "".join(content_lines).strip()
+    }
 
-def chunk_content(parsed_data, max_tokens=500):
+def _chunk_section(section, max_tokens):
+    """Return the chunks of one parsed section, each prefixed with the section's main heading"""
+    # Bound once so the per-block token counts skip the cache and attribute lookups.
+    # encode_ordinary counts special-token text like "<|endoftext|>" as plain text
+    # instead of raising, and is used for every count in this module
+    encode = _get_tokenizer().encode_ordinary
     chunks = []
-    sentence_split_pattern = r'(?<!://)(?<=[.!?])\s+'
     
-    for section in parsed_data:
-        main_heading = section["main_heading"]
-        prefix = f"# {main_heading}\n\n" if main_heading else ""
-        prefix_tokens = count_tokens(prefix)
-        content = section["content"]
+    main_heading = section["main_heading"]
+    prefix = f"# {main_heading}\n\n" if main_heading else ""
+    prefix_tokens = len(encode(prefix))
+    content = section["content"]
 
-        blocks = re.split(r'\n+', content)
-        current_chunk_units = []
-        current_chunk_token_count = prefix_tokens
+    blocks = [block.strip() for block in BLOCK_SPLIT_PATTERN.split(content)]
+    blocks = [block for block in blocks if block]
+    block_token_counts = [len(encode(block)) for block in blocks]
+    current_chunk_units = []
+    current_chunk_token_count = prefix_tokens
 
-        for block in blocks:
-            block = block.strip()
-            if not block:
-                continue
-            block_token_count = count_tokens(block)
-            if block_token_count > (max_tokens - prefix_tokens):
-                subunits = re.split(sentence_split_pattern, block)
-                for subunit in subunits:
-                    subunit = subunit.strip()
-                    if not subunit:
-                        continue
-                    subunit_token_count = count_tokens(subunit)
-                    if subunit_token_count > (max_tokens - prefix_tokens):
-                        token_splits = split_text_by_tokens(subunit, max_tokens - prefix_tokens)
-                        for token_split in token_splits:
-                            token_split = token_split.strip()
-                            unit_tokens = count_tokens(token_split)
-                            if current_chunk_token_count + unit_tokens > max_tokens:
-                                chunk_text = prefix + " ".join(current_chunk_units).strip()
-                                chunks.append({
-                                    "text": chunk_text,
-                                    "metadata": {"main_heading": main_heading}
-                                })
-                                current_chunk_units = []
-                                current_chunk_token_count = prefix_tokens
-                            current_chunk_units.append(token_split)
-                            current_chunk_token_count += unit_tokens
-                    else:
-                        if current_chunk_token_count + subunit_token_count > max_tokens:
+    for block, block_token_count in zip(blocks, block_token_counts):
+        if block_token_count > (max_tokens - prefix_tokens):
+            subunits = SENTENCE_SPLIT_PATTERN.split(block)
+            for subunit in subunits:
+                subunit = subunit.strip()
+                if not subunit:
+                    continue
+                subunit_token_count = len(encode(subunit))
+                if subunit_token_count > (max_tokens - prefix_tokens):
+                    token_splits = split_text_by_tokens(subunit, max_tokens - prefix_tokens)
+                    for token_split in token_splits:
+                        token_split = token_split.strip()
+                        unit_tokens = len(encode(token_split))
+                        if current_chunk_token_count + unit_tokens > max_tokens:
                             chunk_text = prefix + " ".join(current_chunk_units).strip()
                             chunks.append({
                                 "text": chunk_text,
@@ -85,25 +101,57 @@ def chunk_content(parsed_data, max_tokens=500):
                             })
                             current_chunk_units = []
                             current_chunk_token_count = prefix_tokens
-                        current_chunk_units.append(subunit)
-                        current_chunk_token_count += subunit_token_count
-            else:
-                if current_chunk_token_count + block_token_count > max_tokens:
-                    chunk_text = prefix + " ".join(current_chunk_units).strip()
-                    chunks.append({
-                        "text": chunk_text,
-                        "metadata": {"main_heading": main_heading}
-                    })
-                    current_chunk_units = []
-                    current_chunk_token_count = prefix_tokens
-                current_chunk_units.append(block)
-                current_chunk_token_count += block_token_count
+                        current_chunk_units.append(token_split)
+                        current_chunk_token_count += unit_tokens
+                else:
+                    if current_chunk_token_count + subunit_token_count > max_tokens:
+                        chunk_text = prefix + " ".join(current_chunk_units).strip()
+                        chunks.append({
+                            "text": chunk_text,
+                            "metadata": {"main_heading": main_heading}
+                        })
+                        current_chunk_units = []
+                        current_chunk_token_count = prefix_tokens
+                    current_chunk_units.append(subunit)
+                    current_chunk_token_count += subunit_token_count
+        else:
+            if current_chunk_token_count + block_token_count > max_tokens:
+                chunk_text = prefix + " ".join(current_chunk_units).strip()
+                chunks.append({
+                    "text": chunk_text,
+                    "metadata": {"main_heading": main_heading}
+                })
+                current_chunk_units = []
+                current_chunk_token_count = prefix_tokens
+            current_chunk_units.append(block)
+            current_chunk_token_count += block_token_count
 
-        if current_chunk_units:
-            chunk_text = prefix + " ".join(current_chunk_units).strip()
-            chunks.append({
-                "text": chunk_text,
-                "metadata": {"main_heading": main_heading}
-            })
+    if current_chunk_units:
+        chunk_text = prefix + " ".join(current_chunk_units).strip()
+        chunks.append({
+            "text": chunk_text,
+            "metadata": {"main_heading": main_heading}
+        })
 
     return chunks
+
+def chunk_content(parsed_data, max_tokens=500, max_workers=None):
+    """
+    Yield chunks of at most max_tokens tokens, each prefixed with its section's main heading.
+
+    Sections are independent, so they are chunked concurrently on a thread pool (tiktoken
+    releases the GIL while encoding). This pool is the only level of parallelism: sections
+    are tokenized with plain encode_ordinary calls that start no threads of their own, so
+    chunking uses at most max_workers threads (os.cpu_count() by default). Chunks are still
+    yielded in section order, and only a bounded number of sections is read ahead, so a
+    streamed parse stays streamed.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    pending_sections = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for section in parsed_data:
+            if len(pending_sections) >= 2 * max_workers:
+                yield from pending_sections.popleft().result()
+            pending_sections.append(executor.submit(_chunk_section, section, max_tokens))
+        while pending_sections:
+            yield from pending_sections.popleft().result()
@@ -1,66 +1,156 @@
-import pinecone
 from sentence_transformers import SentenceTransformer
 import torch
+import numpy as np
+import hashlib
 import math
+from collections import deque
 
 # Determine device: use GPU if available
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
-def generate_and_store_embeddings(chunks, index, batch_size=50, progress_callback=None):
+EMBEDDING_MODEL_NAME = "all-mpnet-base-v2"
+
+# Pinecone rejects upsert requests over 2 MB; stay a little under it
+MAX_UPSERT_BYTES = 1_900_000
+
+def content_hash(text):
+    """Key a chunk's embedding by its text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def vector_id(source, text):
+    """Key a chunk's Pinecone vector by its source and its text"""
+    # Identical text from two files stays two vectors; re-uploading a file overwrites its own
+    return content_hash(f"{source}\x1f{text}")
+
+def _split_by_payload(vectors, max_bytes=MAX_UPSERT_BYTES):
+    """Split a batch of vectors into requests that each stay under the upsert size limit"""
+    request, request_bytes = [], 0
+    for vector in vectors:
+        # Rough size of one vector: its float32 values plus the metadata text
+        size = len(vector["values"]) * 4 + len(vector["metadata"]["text"].encode("utf-8"))
+        if request and request_bytes + size > max_bytes:
+            yield request
+            request, request_bytes = [], 0
+        request.append(vector)
+        request_bytes += size
+    if request:
+        yield request
+
+def _await_upsert(pending_upsert, batch_progress):
+    """Wait for one async upsert and record it in batch_progress if it failed"""
+    batch_num, vector_count, result = pending_upsert
+    try:
+        result.get()
+    except Exception as e:
+        print(f"Error upserting batch {batch_num + 1}: {str(e)}")
+        batch_progress["failed_vectors"] += vector_count
+        batch_progress["errors"].append(f"Batch {batch_num + 1}: upsert of {vector_count} vectors failed: {str(e)}")
+
+def generate_and_store_embeddings(chunks, index, upsert_batch_size=100, embed_batch_size=32,
+                                  progress_callback=None, embedding_cache=None, max_pending_upserts=8,
+                                  source=None):
     """
     Generate embeddings for chunks and store them in Pinecone with detailed batch-wise progress.
     
     Args:
     - chunks: List of chunk dictionaries with text and optional source.
-    - index: Pinecone index to upsert vectors.
-    - batch_size: Number of vectors to upsert in each batch.
+    - index: Pinecone index to upsert vectors. Create it with pool_threads > 1 so the
+      batches are upserted in parallel.
+    - upsert_batch_size: Number of vectors to upsert in each batch (Pinecone recommends 100).
+      Batches whose payload would exceed 2 MB are split into several requests.
+    - embed_batch_size: Number of chunks the embedding model encodes at once.
     - progress_callback: Callback function for progress updates.
+    - embedding_cache: Optional Database used to reuse embeddings of chunks seen in earlier uploads.
+    - max_pending_upserts: Upsert requests allowed in flight while the next batches are embedded.
+    - source: Name of the uploaded file, used for chunks that carry no source of their own.
     
     Returns:
-    - Dictionary with processing statistics
+    - Dictionary with processing statistics. "failed_vectors" counts chunks that were not
+      stored and "errors" describes each failure; both are empty when the upload succeeded.
     """
-    # Initialize embedding model
-    embedding_model = SentenceTransformer("all-mpnet-base-v2", device=device)
+    # The model is only loaded if some chunk is missing from the cache
+    embedding_model = None
+    
+    # Look up every chunk's cached embedding in one query
+    hashes = [content_hash(chunk["text"]) for chunk in chunks]
+    cached_vectors = {}
+    if embedding_cache is not None:
+        try:
+            cached_vectors = embedding_cache.get_cached_embeddings(set(hashes), EMBEDDING_MODEL_NAME)
+        except Exception as e:
+            print(f"Error reading embedding cache: {str(e)}")
     
     # Calculate total number of batches
     total_chunks = len(chunks)
-    total_batches = math.ceil(total_chunks / batch_size)
+    total_batches = math.ceil(total_chunks / upsert_batch_size)
     
     # Progress tracking dictionary
     batch_progress = {
         "total_chunks": total_chunks,
         "total_batches": total_batches,
         "processed_chunks": 0,
-        "processed_batches": 0
+        "processed_batches": 0,
+        "failed_vectors": 0,
+        "errors": []
     }
     
+    # Batches are embedded one after another on this thread. Each batch's upsert is sent
+    # asynchronously on the index's thread pool, so the next batch is embedded while earlier
+    # upserts are still in flight. At most max_pending_upserts requests are outstanding;
+    # at the limit the oldest one is waited on before another is sent.
+    pending_upserts = deque()
+    
     # Main batch processing loop
     for batch_num in range(total_batches):
+        submitted_vectors = 0
         try:
             # Calculate batch indices
-            start_idx = batch_num * batch_size
-            end_idx = min((batch_num + 1) * batch_size, total_chunks)
+            start_idx = batch_num * upsert_batch_size
+            end_idx = min((batch_num + 1) * upsert_batch_size, total_chunks)
             current_batch = chunks[start_idx:end_idx]
+            batch_hashes = hashes[start_idx:end_idx]
             
-            # Generate embeddings for current batch
+            # Embed only the chunks that aren't cached, in a single encode call
+            missing = [i for i, h in enumerate(batch_hashes) if h not in cached_vectors]
+            if missing:
+                if embedding_model is None:
+                    embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME, device=device)
+                encoded = embedding_model.encode(
+                    [current_batch[i]["text"] for i in missing],
+                    batch_size=embed_batch_size
+                ).astype("float32")
+                fresh = [(batch_hashes[i], vector.tobytes()) for i, vector in zip(missing, encoded)]
+                cached_vectors.update(fresh)
+                if embedding_cache is not None:
+                    try:
+                        embedding_cache.store_cached_embeddings(EMBEDDING_MODEL_NAME, fresh)
+                    except Exception as e:
+                        print(f"Error writing embedding cache: {str(e)}")
+            
+            # Build the vectors for current batch
             vectors = []
             for i, chunk in enumerate(current_batch):
-                unique_id = f"chunk_{batch_num}_{i}"
-                
-                # Generate embedding
-                embedding = embedding_model.encode(chunk["text"]).astype("float32").tolist()
+                chunk_source = chunk.get("source") or source or "unknown"
+                # Keyed on the chunk's source and text, so re-uploading a file overwrites its
+                # vectors whatever the batch size, instead of adding duplicates under new ids
+                unique_id = vector_id(chunk_source, chunk["text"])
+                embedding = np.frombuffer(cached_vectors[batch_hashes[i]], dtype=np.float32).tolist()
                 
                 vectors.append({
                     "id": unique_id,
                     "values": embedding,
                     "metadata": {
                         "text": chunk["text"],
-                        "source": chunk.get("source", "unknown")
+                        "source": chunk_source
                     }
                 })
             
-            # Upsert current batch
-            index.upsert(vectors=vectors)
+            # Upsert current batch asynchronously on the index's thread pool
+            for request in _split_by_payload(vectors):
+                if len(pending_upserts) >= max_pending_upserts:
+                    _await_upsert(pending_upserts.popleft(), batch_progress)
+                pending_upserts.append((batch_num, len(request), index.upsert(vectors=request, async_req=True)))
+                submitted_vectors += len(request)
             
             # Update progress
             batch_progress["processed_chunks"] += len(current_batch)
@@ -77,6 +167,13 @@ def generate_and_store_embeddings(chunks, index, batch_size=50, progress_callbac
         
         except Exception as e:
             print(f"Error processing batch {batch_num + 1}: {str(e)}")
+            # Chunks of this batch that never reached an upsert request are missing from the index
+            batch_progress["failed_vectors"] += len(current_batch) - submitted_vectors
+            batch_progress["errors"].append(f"Batch {batch_num + 1}: {str(e)}")
             continue
     
+    # Wait for every in-flight upsert to finish before reporting the upload as done
+    while pending_upserts:
+        _await_upsert(pending_upserts.popleft(), batch_progress)
+    
     return batch_progress
@@ -1,35 +1,44 @@
-import json
-import pickle
 import numpy as np
-import faiss
 import cohere
 from sentence_transformers import SentenceTransformer
-import pinecone
-from pinecone import ServerlessSpec, Pinecone 
+from pinecone import Pinecone
 from datetime import datetime
 
 class RAGSystem:
-    def __init__(self, api_key, pinecone_api_key, pinecone_environment, index_name):
+    def __init__(self, api_key, pinecone_api_key, pinecone_environment, index_name, index_host=None,
+                 co=None, index=None, embedding_model=None):
+        # co, index and embedding_model hold no conversation state, so callers may pass
+        # instances shared with other RAGSystems instead of building new ones
+        
         # Initialize Cohere client
         self.api_key = api_key
-        self.co = cohere.ClientV2(api_key=self.api_key)
+        self.co = co or cohere.ClientV2(api_key=self.api_key)
         
-        # Initialize Pinecone client
-        self.pc = Pinecone(api_key=pinecone_api_key)
         self.index_name = index_name
         self.pinecone_environment = pinecone_environment
         
-        # Connect to the specified Pinecone index
-        try:
-            self.index = self.pc.Index(self.index_name)
-        except Exception as e:
-            raise ValueError(f"Failed to connect to Pinecone index '{index_name}': {str(e)}")
+        # Connect to the specified Pinecone index (a known host avoids a describe_index call)
+        if index is not None:
+            self.index = index
+        else:
+            try:
+                pc = Pinecone(api_key=pinecone_api_key)
+                if index_host:
+                    self.index = pc.Index(host=index_host)
+                else:
+                    self.index = pc.Index(self.index_name)
+            except Exception as e:
+                raise ValueError(f"Failed to connect to Pinecone index '{index_name}': {str(e)}")
         
         # Initialize embedding model
-        self.embedding_model = SentenceTransformer("all-mpnet-base-v2")
+        self.embedding_model = embedding_model or SentenceTransformer("all-mpnet-base-v2")
         
         # Initialize conversation memory
         self.conversation_summary = ""
+    
+    def reset_conversation_memory(self):
+        """Drop the running summary so a newly opened conversation starts without it"""
+        self.conversation_summary = ""
         
     def retrieve_documents(self, query, chat_history=None):
         """
@@ -165,8 +174,8 @@ Provide a response that is:
         user_query_count = 0
         
         for entry in reversed(chat_history):
-            is_user = entry[1]
-            message_text = entry[2]
+            is_user = entry.is_user
+            message_text = entry.content
             
             if is_user:
                 # Only include user messages
@@ -202,7 +211,7 @@ Provide a response that is:
         if len(chat_history) > 5:
             try:
                 # Create a conversation transcript
-                transcript = "\n".join([f"{'User' if entry[1] else 'Assistant'}: {entry[2]}" for entry in chat_history[-15:]])
+                transcript = "\n".join([f"{'User' if entry.is_user else 'Assistant'}: {entry.content}" for entry in chat_history[-15:]])
                 
                 # Get key topics using Cohere's summarize endpoint
                 response = self.co.summarize(
@@ -223,7 +232,7 @@ Provide a response that is:
                 pass
         
         # Basic extraction - just concatenate the last few user queries
-        user_queries = [entry[2] for entry in chat_history if entry[1]]
+        user_queries = [entry.content for entry in chat_history if entry.is_user]
         return " ".join(user_queries[-3:]) if user_queries else ""
     
     def generate_response_stream(self, user_message, chat_history=None):
@@ -434,8 +443,8 @@ Deliver investment intelligence that is:
     
         # Add selected messages to provide continuity
         for entry in selected_messages:
-            role = "user" if entry[1] else "assistant"
-            messages.append({"role": role, "content": entry[2]})
+            role = "user" if entry.is_user else "assistant"
+            messages.append({"role": role, "content": entry.content})
     
         # Dynamically format the context based on source material types and query
         context_message = self._format_context_for_query(user_message, context, query_type)
@@ -540,7 +549,7 @@ Deliver investment intelligence that is:
         if len(chat_history) > 6:
             try:
                 # Create embeddings for all messages and the current query
-                all_messages = [msg[2] for msg in chat_history[:-6]]  # Skip the most recent 6 we already included
+                all_messages = [msg.content for msg in chat_history[:-6]]  # Skip the most recent 6 we already included
                 
                 if not all_messages:
                     return selected_messages
@@ -571,8 +580,8 @@ Deliver investment intelligence that is:
                     selected_messages.extend(chat_history[:2])  # First 2 messages for context
         
         # Sort all selected messages by their original order
-        message_indices = {msg[0]: i for i, msg in enumerate(chat_history)}
-        selected_messages.sort(key=lambda msg: message_indices.get(msg[0], 0))
+        message_indices = {msg.message_id: i for i, msg in enumerate(chat_history)}
+        selected_messages.sort(key=lambda msg: message_indices.get(msg.message_id, 0))
         
         return selected_messages
     
@@ -588,7 +597,7 @@ Deliver investment intelligence that is:
             # If we have a substantial conversation, use Cohere to maintain a running summary
             # Create a transcript of the most recent part of the conversation
             recent_exchanges = chat_history[-10:] if len(chat_history) >= 10 else chat_history
-            transcript = "\n".join([f"{'User' if entry[1] else 'Assistant'}: {entry[2]}" for entry in recent_exchanges])
+            transcript = "\n".join([f"{'User' if entry.is_user else 'Assistant'}: {entry.content}" for entry in recent_exchanges])
             transcript += f"\nUser: {user_message}"
             
             # If we already have a conversation summary, include it for continuity
@@ -634,7 +643,7 @@ Create a summary that:
             print(f"Error updating conversation memory: {e}")
             # If summarization fails, create a simple summary
             if len(chat_history) > 8:
-                user_queries = [entry[2] for entry in chat_history if entry[1]]
+                user_queries = [entry.content for entry in chat_history if entry.is_user]
                 self.conversation_summary = "Topics discussed: " + " | ".join(user_queries[-5:])
 
     def generate_chat_title(self, message_content):
@@ -0,0 +1,103 @@
+import sqlite3
+import hashlib
+import json
+import threading
+import time
+import numpy as np
+
+class SemanticCache:
+    """
+    Local cache of assistant responses keyed by prompt embedding.
+
+    A lookup returns a stored response when a previous prompt in the same namespace and
+    conversation state is within the cosine similarity threshold, so paraphrased repeats
+    skip the Pinecone query and the LLM call entirely.
+    """
+
+    def __init__(self, db_path="semantic_cache.db", threshold=0.95, ttl_seconds=24 * 60 * 60):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        # One connection shared by all Streamlit sessions, serialized by a lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.init_db()
+
+    def init_db(self):
+        with self.lock:
+            c = self.conn.cursor()
+            c.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                namespace TEXT NOT NULL,
+                state_key TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                response TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            ''')
+            c.execute(
+                "CREATE INDEX IF NOT EXISTS idx_response_cache_lookup "
+                "ON response_cache (namespace, state_key, created_at)"
+            )
+            self.conn.commit()
+
+    @staticmethod
+    def build_state_key(chat_history, turns=4):
+        """Hash the tail of the conversation so answers are only reused in a similar context"""
+        digest = hashlib.sha256()
+        for entry in (chat_history or [])[-turns:]:
+            digest.update(f"{int(bool(entry.is_user))}:{entry.content}\x1f".encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, namespace, state_key, embedding):
+        """Return (response, sources) for the closest cached prompt, or None if nothing is close enough"""
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock:
+            c = self.conn.cursor()
+            c.execute(
+                "SELECT embedding, response, sources FROM response_cache "
+                "WHERE namespace = ? AND state_key = ? AND created_at >= ?",
+                (namespace, state_key, cutoff)
+            )
+            rows = c.fetchall()
+
+        if not rows:
+            return None
+
+        # Stored embeddings are unit length, so a dot product gives cosine similarity
+        query = self._normalize(embedding)
+        matrix = np.frombuffer(b"".join(row[0] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return rows[best][1], json.loads(rows[best][2])
+
+    def clear_index(self, index_name):
+        """Drop every cached response grounded in the given index, e.g. after its contents change"""
+        # Namespaces are "<index_name>:<user_id>"
+        prefix = f"{index_name}:"
+        with self.lock:
+            c = self.conn.cursor()
+            c.execute("DELETE FROM response_cache WHERE substr(namespace, 1, ?) = ?", (len(prefix), prefix))
+            self.conn.commit()
+
+    def store(self, namespace, state_key, embedding, response, sources):
+        """Cache a response and drop entries that have outlived the TTL"""
+        now = time.time()
+        with self.lock:
+            c = self.conn.cursor()
+            c.execute("DELETE FROM response_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            c.execute(
+                "INSERT INTO response_cache (namespace, state_key, embedding, response, sources, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, state_key, self._normalize(embedding).tobytes(), response,
+                 json.dumps(sources, default=str), now)
+            )
+            self.conn.commit()